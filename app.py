@@ -1,18 +1,27 @@
 import os
-import io
+import math
+import hashlib
 import time
-import requests
+import asyncio
+import httpx
+import orjson
 import logging
-import statistics
 import pandas as pd
+from cachetools import TTLCache
 from collections import Counter
-from urllib.parse import urlparse, urlunparse
-
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File
-from io import StringIO, BytesIO
+from contextlib import asynccontextmanager, nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 # =========================================================
 # SETUP
@@ -22,16 +31,127 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("LinkedInScraperAPI")
 
-app = FastAPI(title="LinkedIn Scraper API Wrapper")
 
-# Allow frontend (React, etc.)
+class ORJSONResponse(Response):
+    """JSON response rendered with orjson (non-str dict keys allowed)."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RetryAfterTransport(httpx.AsyncBaseTransport):
+    """
+    Retries 429/5xx responses with exponential backoff, waiting for the
+    server's Retry-After instead whenever it sends one. A Retry-After longer
+    than `max_wait`, or a retry that would run past `max_total` seconds,
+    returns the response straight away. Each retry takes a token from
+    `limiter` so it counts against the RapidAPI rate like any other call.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        limiter=None,
+        retries: int = 5,
+        backoff_factor: float = 0.5,
+        max_wait: float = 10,
+        max_total: float = 30,
+    ):
+        self.transport = transport
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_wait = max_wait
+        self.max_total = max_total
+
+    def _retry_after(self, response: httpx.Response):
+        """Seconds requested by Retry-After, or None if absent/unusable."""
+        retry_after = response.headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                wait = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+        if math.isnan(wait):
+            return None
+        return max(wait, 0)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            if attempt and self.limiter is not None:
+                await self.limiter.acquire()
+
+            response = await self.transport.handle_async_request(request)
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                return response
+
+            wait = self._retry_after(response)
+            if wait is None:
+                wait = min(self.backoff_factor * 2 ** attempt, self.max_wait)
+            elif wait > self.max_wait:
+                # e.g. an exhausted quota: give up now rather than hold the caller
+                return response
+            if time.monotonic() - started + wait > self.max_total:
+                return response
+
+            await response.aclose()
+            logger.warning(
+                f"⚠️ {response.status_code} from {request.url.host} — "
+                f"retry {attempt+1}/{self.retries} after {wait:.2f}s..."
+            )
+            await asyncio.sleep(wait)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+# Shared async client for every route, opened/closed with the app. RapidAPI
+# speaks HTTP/2, where httpx multiplexes concurrent requests over a single
+# connection anyway; the pool limit only matters if ALPN falls back to
+# HTTP/1.1, and must then leave room for several bulk uploads at once.
+CLIENT: httpx.AsyncClient = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global CLIENT
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=2,  # connection failures only; status retries happen below
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+    )
+    CLIENT = httpx.AsyncClient(
+        transport=RetryAfterTransport(transport, limiter=BUCKET),
+        timeout=30,
+        # requests followed redirects by default; httpx doesn't
+        follow_redirects=True,
+        # JSON compresses well; httpx decodes br transparently with brotli installed
+        headers={"Accept-Encoding": "br, gzip"},
+    )
+    yield
+    await CLIENT.aclose()
+
+
+app = FastAPI(
+    title="LinkedIn Scraper API Wrapper",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+# Allow frontend (React, etc.). "*" already covers the local dev origins.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:5173",
-        "http://127.0.0.1:5173",
-        "*",
-    ],
+    allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -39,88 +159,253 @@ app.add_middleware(
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY", "")
 RAPIDAPI_HOST = "linkedin-scraper-api-real-time-fast-affordable.p.rapidapi.com"
 
+# Prebuilt URLs for every endpoint the routes call
+URL_CACHE = {
+    ep: f"https://{RAPIDAPI_HOST}/{ep}"
+    for ep in (
+        "profile/detail",
+        "profile/posts",
+        "post/comments",
+        "post/reactions",
+        "companies/detail",
+    )
+}
+
+# Max number of in-flight RapidAPI calls per bulk upload
+BULK_CONCURRENCY = 4
+
 # =========================================================
 # RATE LIMITER
 # =========================================================
-last_call_time = 0
+class TokenBucket:
+    """
+    Async token bucket: allows bursts of up to `capacity` calls while keeping
+    the long-term rate at `rate` calls per second.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = asyncio.Lock()
 
+    async def acquire(self, n: float = 1):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                sleep_for = (n - self.tokens) / self.rate
+                logger.info(f"⏳ Rate limit enforced, sleeping {sleep_for:.2f}s")
+                await asyncio.sleep(sleep_for)
 
-def rate_limit(min_interval=1.2):
-    """Ensure at least 1.2 seconds between RapidAPI calls."""
-    global last_call_time
-    now = time.time()
-    elapsed = now - last_call_time
-    if elapsed < min_interval:
-        sleep_for = min_interval - elapsed
-        logger.info(f"⏳ Rate limit enforced, sleeping {sleep_for:.2f}s")
-        time.sleep(sleep_for)
-    last_call_time = time.time()
+
+BUCKET = TokenBucket(capacity=5, rate=1 / 1.2)
+
+
+# =========================================================
+# RESPONSE CACHE
+# =========================================================
+# Identical lookups within the TTL are served locally instead of spending
+# another RapidAPI call. Entries are scoped to the RapidAPI key that paid
+# for them, so one caller's key never serves data to another.
+CACHE = TTLCache(maxsize=10_000, ttl=600)
+
+# One shared upstream task per cache key, so concurrent duplicates collapse
+# to a single call and all see its result or its exception. _WAITERS counts
+# the callers awaiting each task so it is cancelled once nobody wants it.
+_INFLIGHT: dict = {}
+_WAITERS: dict = {}
+
+
+def _cache_key(endpoint: str, params: dict, rapidapi_key: str) -> tuple:
+    key_hash = hashlib.sha256(rapidapi_key.encode()).hexdigest()
+    return (key_hash, endpoint, tuple(sorted(params.items())))
+
+
+def _settle(cache_key: tuple, task: asyncio.Task):
+    """Done-callback for an upstream task: cache a success, clear the slot."""
+    if _INFLIGHT.get(cache_key) is task:
+        del _INFLIGHT[cache_key]
+    _WAITERS.pop(task, None)
+    if not task.cancelled() and task.exception() is None:
+        CACHE[cache_key] = task.result()
 
 
 # =========================================================
 # HELPERS
 # =========================================================
 def clean_linkedin_url(url: str) -> str:
-    parsed = urlparse(url)
-    return urlunparse(parsed._replace(query=""))
+    """Strip the query string and fragment from a LinkedIn URL."""
+    return url.split("?", 1)[0].split("#", 1)[0]
 
 
-def fetch_from_rapidapi(endpoint: str, params: dict, rapidapi_key: str = None):
-    """Generic fetch with retry + rate limiting"""
-    key_to_use = rapidapi_key or RAPIDAPI_KEY
-    if not key_to_use:
+async def require_key(request: Request) -> str:
+    """
+    Dependency resolving the RapidAPI key (header first, then env) once per
+    request. Async so FastAPI doesn't send it through the threadpool.
+    """
+    key = request.headers.get("x-rapidapi-key") or RAPIDAPI_KEY
+    if not key:
         raise HTTPException(status_code=400, detail="Missing RapidAPI key.")
+    return key
 
-    headers = {
-        "x-rapidapi-key": key_to_use,
-        "x-rapidapi-host": RAPIDAPI_HOST,
-    }
-
-    url = f"https://{RAPIDAPI_HOST}/{endpoint}"
 
-    for attempt in range(3):
+def _decode_json(content: bytes):
+    """Decode a RapidAPI body with orjson; empty or invalid bodies become 502s."""
+    try:
+        data = orjson.loads(content) if content else None
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=502, detail="Invalid JSON response.")
+    if not data:
+        raise HTTPException(status_code=502, detail="Empty response.")
+    return data
+
+
+async def fetch_from_rapidapi(
+    endpoint: str,
+    params: dict,
+    rapidapi_key: str,
+    sem: asyncio.Semaphore = None,
+):
+    """
+    Generic fetch with caching + rate limiting. `rapidapi_key` is already
+    validated by `require_key`; bulk routes pass `sem` to bound how many of
+    their calls are in flight at once.
+    """
+    cache_key = _cache_key(endpoint, params, rapidapi_key)
+    cached = CACHE.get(cache_key)
+    if cached is not None:
+        logger.info(f"♻️ Cache hit for {endpoint} params={params}")
+        return cached
+
+    task = _INFLIGHT.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_request(endpoint, params, rapidapi_key, sem))
+        _INFLIGHT[cache_key] = task
+        task.add_done_callback(lambda t: _settle(cache_key, t))
+
+    # Shielded so one caller going away doesn't cancel the call for the rest;
+    # the last caller to go away cancels it so abandoned work stops
+    _WAITERS[task] = _WAITERS.get(task, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if _WAITERS.get(task) == 1 and not task.done():
+            task.cancel()
+        raise
+    finally:
+        if task in _WAITERS:
+            _WAITERS[task] -= 1
+
+
+@lru_cache(maxsize=8)
+def _headers(key: str) -> Mapping[str, str]:
+    """Read-only RapidAPI headers for `key`, built once per distinct key."""
+    return MappingProxyType({"x-rapidapi-key": key, "x-rapidapi-host": RAPIDAPI_HOST})
+
+
+async def _request(endpoint: str, params: dict, key: str, sem: asyncio.Semaphore = None):
+    url = URL_CACHE.get(endpoint) or f"https://{RAPIDAPI_HOST}/{endpoint}"
+    headers = _headers(key)
+
+    # 429/5xx are retried (honouring Retry-After) by RetryAfterTransport
+    async with sem or nullcontext():
+        await BUCKET.acquire()
+        logger.info(f"➡️ Fetching {url} params={params}")
         try:
-            rate_limit()
-            logger.info(f"➡️ [{attempt+1}/3] Fetching {url} params={params}")
-            res = requests.get(url, headers=headers, params=params, timeout=30)
-
-            if res.status_code == 429:
-                wait = 2 ** attempt
-                logger.warning(f"⚠️ 429 quota hit — retrying after {wait}s...")
-                time.sleep(wait)
-                continue
-
-            res.raise_for_status()
-            data = res.json()
-            if not data:
-                raise HTTPException(status_code=502, detail="Empty response.")
-            return data
-
-        except requests.exceptions.RequestException as e:
+            res = await CLIENT.get(url, headers=headers, params=params)
+        except httpx.HTTPError as e:
             logger.error(f"Request error: {e}")
-            if attempt == 2:
-                raise HTTPException(status_code=500, detail=str(e))
+            raise HTTPException(status_code=500, detail=str(e))
+
+    if logger.isEnabledFor(logging.DEBUG):
+        # Slice the raw bytes so only the preview gets decoded
+        preview = res.content[:300].decode("utf-8", "replace")
+        logger.debug(f"{res.http_version} {res.status_code} from {url}: {preview}")
+
+    if res.status_code == 429:
+        logger.warning("⚠️ 429 quota hit — giving up")
+        raise HTTPException(status_code=429, detail="RapidAPI quota exceeded.")
+
+    try:
+        res.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Request error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-    raise HTTPException(status_code=429, detail="RapidAPI quota exceeded.")
+    return _decode_json(res.content)
 
 
-def process_csv_upload(file: UploadFile) -> pd.DataFrame:
+def summarize_comments(comments: list) -> dict:
+    """
+    Build the comment analytics summary in a single pass over `comments`,
+    updating the author/reaction counters and the running total together.
+    """
+    authors = Counter()
+    reactions = Counter()
+    total = 0
+
+    for c in comments:
+        name = (c.get("author") or {}).get("name")
+        if name:
+            authors[name] += 1
+        r = (c.get("stats") or {}).get("total_reactions") or 0
+        reactions[r] += 1
+        total += r
+
+    n = len(comments)
+    return {
+        "total_comments": n,
+        "unique_commenters": len(authors),
+        "average_reactions": total / n if n else 0,
+        "top_commenters": authors.most_common(5),
+        "reaction_histogram": dict(reactions),
+    }
+
+
+def process_csv_upload(file: UploadFile, expected_col: str) -> pd.DataFrame:
     """
     Process uploaded CSV or Excel file and return a pandas DataFrame.
     Supports .csv, .xls, and .xlsx formats.
+
+    The upload is parsed straight from its spooled file and only
+    `expected_col` (matched case/space-insensitively, first match wins) is
+    kept, as strings. CSVs are parsed with the pyarrow engine into
+    Arrow-backed columns.
     """
     filename = file.filename.lower()
 
+    def wanted(col) -> bool:
+        return str(col).strip().lower() == expected_col
+
     try:
         # Read CSV
         if filename.endswith(".csv"):
-            contents = file.file.read().decode("utf-8")
-            df = pd.read_csv(StringIO(contents))
+            # The pyarrow engine only takes literal column names, so resolve
+            # the header first
+            header = pd.read_csv(file.file, nrows=0).columns
+            matches = [c for c in header if wanted(c)][:1]
+            if not matches:
+                return pd.DataFrame()
+
+            file.file.seek(0)
+            df = pd.read_csv(
+                file.file,
+                engine="pyarrow",
+                dtype_backend="pyarrow",
+                usecols=matches,
+                # Keep values verbatim ("00123" stays "00123") instead of inferring
+                dtype={matches[0]: "string[pyarrow]"},
+            )
 
         # Read Excel (.xls or .xlsx)
         elif filename.endswith((".xls", ".xlsx")):
-            contents = file.file.read()
-            df = pd.read_excel(BytesIO(contents))
+            df = pd.read_excel(file.file, usecols=wanted, dtype="string")
 
         else:
             raise HTTPException(
@@ -130,11 +415,13 @@ def process_csv_upload(file: UploadFile) -> pd.DataFrame:
 
         # Strip spaces in column names
         df.columns = df.columns.str.strip().str.lower()
-        return df
+        # Headers like "username,Username" normalise to the same name
+        return df.loc[:, ~df.columns.duplicated()]
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
 
+
 # =========================================================
 # ROUTES
 # =========================================================
@@ -145,302 +432,309 @@ async def root():
 
 # ---------- PROFILE ----------
 @app.get("/api/profile")
-def get_profile(request: Request, username: str):
-    return fetch_from_rapidapi(
+async def get_profile(username: str, key: str = Depends(require_key)):
+    return await fetch_from_rapidapi(
         "profile/detail",
         {"username": username},
-        request.headers.get("x-rapidapi-key"),
+        key,
     )
 
 
 @app.get("/api/posts")
-def get_posts(request: Request, username: str, page_number: int = 1):
-    return fetch_from_rapidapi(
+async def get_posts(username: str, page_number: int = 1, key: str = Depends(require_key)):
+    return await fetch_from_rapidapi(
         "profile/posts",
         {"username": username, "page_number": page_number},
-        request.headers.get("x-rapidapi-key"),
+        key,
     )
 
 
 @app.get("/api/comments")
-def get_comments(
-    request: Request,
+async def get_comments(
     post_url: str,
     page_number: int = 1,
     sort_order: str = "Most relevant",
+    key: str = Depends(require_key),
 ):
     clean_url = clean_linkedin_url(post_url)
-    return fetch_from_rapidapi(
+    return await fetch_from_rapidapi(
         "post/comments",
         {"post_url": clean_url, "page_number": page_number, "sort_order": sort_order},
-        request.headers.get("x-rapidapi-key"),
+        key,
     )
 
 
 @app.get("/api/company")
-def get_company(request: Request, identifier: str):
-    return fetch_from_rapidapi(
+async def get_company(identifier: str, key: str = Depends(require_key)):
+    return await fetch_from_rapidapi(
         "companies/detail",
         {"identifier": identifier},
-        request.headers.get("x-rapidapi-key"),
+        key,
     )
 
 
 # ---------- ANALYTICS ----------
 @app.get("/api/analytics/comments")
-def comment_analytics(request: Request, post_url: str):
+async def comment_analytics(post_url: str, key: str = Depends(require_key)):
     clean_url = clean_linkedin_url(post_url)
-    data = fetch_from_rapidapi(
+    data = await fetch_from_rapidapi(
         "post/comments",
         {"post_url": clean_url},
-        request.headers.get("x-rapidapi-key"),
+        key,
     )
 
     comments = data.get("data", {}).get("comments", [])
     if not comments:
         return {"success": False, "error": "No comments found"}
 
-    authors = [c.get("author", {}).get("name") for c in comments if c.get("author", {}).get("name")]
-    reactions = [c.get("stats", {}).get("total_reactions", 0) for c in comments]
-
-    return {
-        "success": True,
-        "summary": {
-            "total_comments": len(comments),
-            "unique_commenters": len(set(authors)),
-            "average_reactions": statistics.mean(reactions) if reactions else 0,
-            "top_commenters": Counter(authors).most_common(5),
-        },
-    }
+    return {"success": True, "summary": summarize_comments(comments)}
 
 
 # ---------- REACTIONS ----------
 class ReactionRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra="ignore", frozen=True)
+
     post_url: str
     page_number: str = "1"
     reaction_type: str = "ALL"
 
 
 @app.post("/api/post/reactions")
-async def get_post_reactions(request_data: ReactionRequest, request: Request):
-    post_url = request_data.post_url.strip()
+async def get_post_reactions(request_data: ReactionRequest, key: str = Depends(require_key)):
+    post_url = request_data.post_url
     if not post_url:
         raise HTTPException(status_code=400, detail="Missing post_url")
 
-    key = request.headers.get("x-rapidapi-key", RAPIDAPI_KEY)
     params = {
         "post_url": post_url,
         "page_number": request_data.page_number,
         "reaction_type": request_data.reaction_type,
     }
-    return fetch_from_rapidapi("post/reactions", params, key)
+    return await fetch_from_rapidapi("post/reactions", params, key)
 
 # =========================================================
 # BULK UPLOAD ROUTES
 # =========================================================
-@app.post("/api/upload/profiles")
-async def upload_usernames_csv(file: UploadFile = File(...), request: Request = None):
+# Bulk routes stream one NDJSON line per unique input value as soon as its
+# fetch finishes, so rows arrive in completion order rather than CSV order.
+# Streaming keeps the response body itself from being buffered, but every
+# fetched payload still lands in CACHE (up to 10k entries for 10 minutes),
+# so peak memory is bounded by the cache, not by the concurrency limit.
+
+
+def _column_values(df: pd.DataFrame, col: str, clean_urls: bool = False) -> list:
     """
-    Upload a CSV file containing LinkedIn usernames and fetch their profile data.
+    Unique, non-empty, stripped values of `col`; optionally cleaned as
+    LinkedIn URLs first so links differing only by query collapse together.
     """
-    logger.info(f"📂 Received file: {file.filename if file else 'No file'}")
-    df = process_csv_upload(file)
+    values = df[col].dropna().astype("string[pyarrow]").str.strip()
+    if clean_urls:
+        # Vectorized clean_linkedin_url; a regex replace runs in Arrow compute
+        # instead of building a Python list per row like .str.split does
+        values = values.str.replace(r"[?#].*", "", regex=True)
+    return values[values != ""].drop_duplicates().tolist()
 
-    if "username" not in df.columns:
-        raise HTTPException(status_code=400, detail="CSV must contain a 'username' column.")
 
-    results = []
-    key = request.headers.get("x-rapidapi-key", RAPIDAPI_KEY)
+def _bulk_result(field: str, value: str, res, action: str) -> dict:
+    """Shape one finished fetch (data or exception) into a bulk result row."""
+    if isinstance(res, BaseException):
+        detail = res.detail if isinstance(res, HTTPException) else str(res)
+        logger.error(f"❌ Error {action} {value}: {detail}")
+        return {field: value, "error": detail}
+    return {field: value, "data": res}
+
 
-    for username in df["username"]:
-        username = str(username).strip()
-        if not username:
-            continue
+async def _fetch_stream(field: str, values: list, fetch, action: str):
+    """
+    Run `fetch(value)` for every value and yield result rows in the order
+    they finish. If the client goes away, unfinished fetches are cancelled
+    and their upstream calls stop, unless another request is still waiting
+    on the same in-flight lookup.
+    """
 
+    async def run(value):
         try:
-            logger.info(f"📥 Fetching LinkedIn profile for {username}")
-            data = fetch_from_rapidapi("profile/detail", {"username": username}, key)
-            results.append({"username": username, "data": data})
-        except HTTPException as e:
-            logger.error(f"❌ Error fetching {username}: {e.detail}")
-            results.append({"username": username, "error": e.detail})
+            return value, await fetch(value)
+        except Exception as e:
+            return value, e
 
-        time.sleep(1.5)
+    tasks = [asyncio.create_task(run(v)) for v in values]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            value, res = await next_done
+            yield _bulk_result(field, value, res, action)
+    finally:
+        for task in tasks:
+            task.cancel()
 
-    return {"success": True, "count": len(results), "results": results}
 
+def _ndjson(rows) -> StreamingResponse:
+    """Stream bulk result rows as newline-delimited JSON, one row per line."""
 
+    async def body():
+        async for row in rows:
+            yield orjson.dumps(row, option=orjson.OPT_NON_STR_KEYS) + b"\n"
 
-@app.post("/api/upload/posts")
-async def upload_posts_csv(file: UploadFile = File(...), request: Request = None):
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.post("/api/upload/profiles")
+async def upload_usernames_csv(file: UploadFile = File(...), key: str = Depends(require_key)):
     """
-    Upload a CSV containing LinkedIn usernames and fetch their posts.
+    Upload a CSV file containing LinkedIn usernames and fetch their profile data.
     """
-    logger.info(f"📂 Received posts CSV: {file.filename if file else 'No file'}")
-    df = process_csv_upload(file)
+    logger.info(f"📂 Received file: {file.filename if file else 'No file'}")
+    df = await run_in_threadpool(process_csv_upload, file, "username")
 
     if "username" not in df.columns:
         raise HTTPException(status_code=400, detail="CSV must contain a 'username' column.")
 
-    results = []
-    key = request.headers.get("x-rapidapi-key", RAPIDAPI_KEY)
+    sem = asyncio.Semaphore(BULK_CONCURRENCY)
+    usernames = _column_values(df, "username")
 
-    for username in df["username"]:
-        username = str(username).strip()
-        if not username:
-            continue
+    logger.info(f"📥 Fetching {len(usernames)} LinkedIn profiles")
+    rows = _fetch_stream(
+        "username",
+        usernames,
+        lambda u: fetch_from_rapidapi("profile/detail", {"username": u}, key, sem),
+        "fetching",
+    )
+    return _ndjson(rows)
 
-        try:
-            logger.info(f"📥 Fetching posts for {username}")
-            data = fetch_from_rapidapi("profile/posts", {"username": username, "page_number": 1}, key)
-            results.append({"username": username, "data": data})
-        except HTTPException as e:
-            logger.error(f"❌ Error fetching posts for {username}: {e.detail}")
-            results.append({"username": username, "error": e.detail})
 
-        time.sleep(1.5)
+@app.post("/api/upload/posts")
+async def upload_posts_csv(file: UploadFile = File(...), key: str = Depends(require_key)):
+    """
+    Upload a CSV containing LinkedIn usernames and fetch their posts.
+    """
+    logger.info(f"📂 Received posts CSV: {file.filename if file else 'No file'}")
+    df = await run_in_threadpool(process_csv_upload, file, "username")
+
+    if "username" not in df.columns:
+        raise HTTPException(status_code=400, detail="CSV must contain a 'username' column.")
 
-    return {"success": True, "count": len(results), "results": results}
+    sem = asyncio.Semaphore(BULK_CONCURRENCY)
+    usernames = _column_values(df, "username")
+
+    logger.info(f"📥 Fetching posts for {len(usernames)} usernames")
+    rows = _fetch_stream(
+        "username",
+        usernames,
+        lambda u: fetch_from_rapidapi("profile/posts", {"username": u, "page_number": 1}, key, sem),
+        "fetching posts for",
+    )
+    return _ndjson(rows)
 
 
 @app.post("/api/upload/comments")
-async def upload_comments_csv(file: UploadFile = File(...), request: Request = None):
+async def upload_comments_csv(file: UploadFile = File(...), key: str = Depends(require_key)):
     """
     Upload a CSV containing LinkedIn post URLs and fetch their comments.
     """
     logger.info(f"📂 Received comments CSV: {file.filename if file else 'No file'}")
-    df = process_csv_upload(file)
+    df = await run_in_threadpool(process_csv_upload, file, "post_url")
 
     if "post_url" not in df.columns:
         raise HTTPException(status_code=400, detail="CSV must contain a 'post_url' column.")
 
-    results = []
-    key = request.headers.get("x-rapidapi-key", RAPIDAPI_KEY)
+    sem = asyncio.Semaphore(BULK_CONCURRENCY)
+    urls = _column_values(df, "post_url", clean_urls=True)
 
-    for post_url in df["post_url"]:
-        clean_url = clean_linkedin_url(str(post_url).strip())
-        if not clean_url:
-            continue
-
-        try:
-            logger.info(f"💬 Fetching comments for {clean_url}")
-            data = fetch_from_rapidapi("post/comments", {"post_url": clean_url}, key)
-            results.append({"post_url": clean_url, "data": data})
-        except HTTPException as e:
-            logger.error(f"❌ Error fetching comments for {clean_url}: {e.detail}")
-            results.append({"post_url": clean_url, "error": e.detail})
-
-        time.sleep(1.5)
-
-    return {"success": True, "count": len(results), "results": results}
+    logger.info(f"💬 Fetching comments for {len(urls)} posts")
+    rows = _fetch_stream(
+        "post_url",
+        urls,
+        lambda u: fetch_from_rapidapi("post/comments", {"post_url": u}, key, sem),
+        "fetching comments for",
+    )
+    return _ndjson(rows)
 
 
 @app.post("/api/upload/companies")
-async def upload_companies_csv(file: UploadFile = File(...), request: Request = None):
+async def upload_companies_csv(file: UploadFile = File(...), key: str = Depends(require_key)):
     """
     Upload a CSV containing LinkedIn company identifiers and fetch their details.
     """
     logger.info(f"📂 Received companies CSV: {file.filename if file else 'No file'}")
-    df = process_csv_upload(file)
+    df = await run_in_threadpool(process_csv_upload, file, "identifier")
 
     if "identifier" not in df.columns:
         raise HTTPException(status_code=400, detail="CSV must contain an 'identifier' column.")
 
-    results = []
-    key = request.headers.get("x-rapidapi-key", RAPIDAPI_KEY)
-
-    for identifier in df["identifier"]:
-        identifier = str(identifier).strip()
-        if not identifier:
-            continue
-
-        try:
-            logger.info(f"🏢 Fetching company details for {identifier}")
-            data = fetch_from_rapidapi("companies/detail", {"identifier": identifier}, key)
-            results.append({"identifier": identifier, "data": data})
-        except HTTPException as e:
-            logger.error(f"❌ Error fetching company {identifier}: {e.detail}")
-            results.append({"identifier": identifier, "error": e.detail})
-
-        time.sleep(1.5)
+    sem = asyncio.Semaphore(BULK_CONCURRENCY)
+    identifiers = _column_values(df, "identifier")
 
-    return {"success": True, "count": len(results), "results": results}
+    logger.info(f"🏢 Fetching company details for {len(identifiers)} identifiers")
+    rows = _fetch_stream(
+        "identifier",
+        identifiers,
+        lambda i: fetch_from_rapidapi("companies/detail", {"identifier": i}, key, sem),
+        "fetching company",
+    )
+    return _ndjson(rows)
 
 
 @app.post("/api/upload/comment-analytics")
-async def upload_comment_analytics_csv(file: UploadFile = File(...), request: Request = None):
+async def upload_comment_analytics_csv(file: UploadFile = File(...), key: str = Depends(require_key)):
     """
     Upload a CSV containing post URLs and compute comment analytics for each.
     """
     logger.info(f"📂 Received comment analytics CSV: {file.filename if file else 'No file'}")
-    df = process_csv_upload(file)
+    df = await run_in_threadpool(process_csv_upload, file, "post_url")
 
     if "post_url" not in df.columns:
         raise HTTPException(status_code=400, detail="CSV must contain a 'post_url' column.")
 
-    results = []
-    key = request.headers.get("x-rapidapi-key", RAPIDAPI_KEY)
-
-    for post_url in df["post_url"]:
-        clean_url = clean_linkedin_url(str(post_url).strip())
-        if not clean_url:
-            continue
-
-        try:
-            logger.info(f"📊 Analyzing comments for {clean_url}")
-            data = fetch_from_rapidapi("post/comments", {"post_url": clean_url}, key)
-            comments = data.get("data", {}).get("comments", [])
-            if not comments:
-                results.append({"post_url": clean_url, "error": "No comments found"})
-                continue
-
-            authors = [c.get("author", {}).get("name") for c in comments if c.get("author", {}).get("name")]
-            reactions = [c.get("stats", {}).get("total_reactions", 0) for c in comments]
-
-            summary = {
-                "total_comments": len(comments),
-                "unique_commenters": len(set(authors)),
-                "average_reactions": statistics.mean(reactions) if reactions else 0,
-                "top_commenters": Counter(authors).most_common(5),
-            }
-            results.append({"post_url": clean_url, "summary": summary})
+    sem = asyncio.Semaphore(BULK_CONCURRENCY)
+    urls = _column_values(df, "post_url", clean_urls=True)
 
-        except HTTPException as e:
-            logger.error(f"❌ Error analyzing {clean_url}: {e.detail}")
-            results.append({"post_url": clean_url, "error": e.detail})
-
-        time.sleep(1.5)
+    logger.info(f"📊 Analyzing comments for {len(urls)} posts")
+    comment_rows = _fetch_stream(
+        "post_url",
+        urls,
+        lambda u: fetch_from_rapidapi("post/comments", {"post_url": u}, key, sem),
+        "analyzing",
+    )
 
-    return {"success": True, "count": len(results), "results": results}
+    async def rows():
+        async for row in comment_rows:
+            if "error" not in row:
+                clean_url = row["post_url"]
+                # Headers are already sent, so a malformed payload must become
+                # an error row rather than cutting the stream off
+                try:
+                    comments = row["data"].get("data", {}).get("comments", [])
+                    if comments:
+                        row = {"post_url": clean_url, "summary": summarize_comments(comments)}
+                    else:
+                        row = {"post_url": clean_url, "error": "No comments found"}
+                except Exception as e:
+                    logger.error(f"❌ Error analyzing {clean_url}: {e}")
+                    row = {"post_url": clean_url, "error": f"Unexpected response format: {e}"}
+            yield row
+
+    return _ndjson(rows())
 
 
 @app.post("/api/upload/reactions")
-async def upload_reactions_csv(file: UploadFile = File(...), request: Request = None):
+async def upload_reactions_csv(file: UploadFile = File(...), key: str = Depends(require_key)):
     """
     Upload a CSV containing LinkedIn post URLs and fetch their reactions.
     """
     logger.info(f"📂 Received reactions CSV: {file.filename if file else 'No file'}")
-    df = process_csv_upload(file)
+    df = await run_in_threadpool(process_csv_upload, file, "post_url")
 
     if "post_url" not in df.columns:
         raise HTTPException(status_code=400, detail="CSV must contain a 'post_url' column.")
 
-    results = []
-    key = request.headers.get("x-rapidapi-key", RAPIDAPI_KEY)
+    sem = asyncio.Semaphore(BULK_CONCURRENCY)
+    urls = _column_values(df, "post_url", clean_urls=True)
 
-    for post_url in df["post_url"]:
-        clean_url = clean_linkedin_url(str(post_url).strip())
-        if not clean_url:
-            continue
-
-        try:
-            logger.info(f"💡 Fetching reactions for {clean_url}")
-            data = fetch_from_rapidapi("post/reactions", {"post_url": clean_url}, key)
-            results.append({"post_url": clean_url, "data": data})
-        except HTTPException as e:
-            logger.error(f"❌ Error fetching reactions for {clean_url}: {e.detail}")
-            results.append({"post_url": clean_url, "error": e.detail})
-
-        time.sleep(1.5)
-
-    return {"success": True, "count": len(results), "results": results}
+    logger.info(f"💡 Fetching reactions for {len(urls)} posts")
+    rows = _fetch_stream(
+        "post_url",
+        urls,
+        lambda u: fetch_from_rapidapi("post/reactions", {"post_url": u}, key, sem),
+        "fetching reactions for",
+    )
+    return _ndjson(rows)